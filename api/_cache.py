@@ -0,0 +1,93 @@
+import functools
+import hashlib
+import inspect
+import os
+import sqlite3
+from threading import Lock
+
+class _DiskCache:
+    """
+    Content-addressed store of model responses backed by an SQLite file.
+
+    Responses are generated with temperature 0, so entries never expire.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = Lock()
+
+    def _connect(self):
+        # Opened lazily so importing an API module never touches the filesystem
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cache(key TEXT PRIMARY KEY, response TEXT)")
+        return self.conn
+
+    def get(self, key):
+        with self.lock:
+            row = self._connect().execute("SELECT response FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, response):
+        with self.lock:
+            self._connect().execute("INSERT OR IGNORE INTO cache (key, response) VALUES (?, ?)", (key, response))
+
+_caches = {}
+_caches_lock = Lock()
+
+def _get_cache(path):
+    # Every wrapped function pointing at the same file shares one connection
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = _DiskCache(path)
+        return _caches[path]
+
+def _key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode()).hexdigest()
+
+def _cache_enabled():
+    return os.getenv("LLM_CACHE", "1") == "1"
+
+def lru_disk_cache(path=".llm_cache.sqlite", enabled=None):
+    """
+    Cache a get_response(prompt, model_name=...) function on disk.
+
+    Failed calls (None) are not cached so they are retried on the next run.
+    Set LLM_CACHE=0 to bypass the cache entirely. The variable is read on every
+    call, so a value loaded from .env after import still takes effect.
+
+    Args:
+        path (str): Path to the SQLite cache file.
+        enabled (bool or None): Whether the cache is consulted at all; None defers to LLM_CACHE.
+
+    Returns:
+        callable: Decorator for get_response functions.
+    """
+    cache = _get_cache(path)
+
+    def decorator(fn):
+        if enabled is False:
+            return fn
+        signature = inspect.signature(fn)
+
+        def key_for(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return _key(bound.arguments["model_name"], bound.arguments["prompt"])
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if enabled is None and not _cache_enabled():
+                return fn(*args, **kwargs)
+            key = key_for(args, kwargs)
+            response = cache.get(key)
+            if response is None:
+                response = fn(*args, **kwargs)
+                if response is not None:
+                    cache.put(key, response)
+            return response
+        return wrapper
+
+    return decorator
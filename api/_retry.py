@@ -0,0 +1,61 @@
+import logging
+import random
+import time
+
+def _retry_after(e):
+    """
+    Extract the server-requested delay from an SDK exception, if any.
+
+    Args:
+        e (Exception): The exception raised by the SDK call.
+
+    Returns:
+        float or None: Seconds to wait according to the Retry-After header, or None if absent.
+    """
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(e, attempt, base, cap, max_retry_after):
+    retry_after = _retry_after(e)
+    if retry_after is not None:
+        # Honour the server, but never park a worker thread for longer than max_retry_after
+        return min(max_retry_after, retry_after)
+    # Jitter keeps parallel workers from retrying in lock-step against the rate limit
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def call_with_retry(fn, retry_on, *, max_attempts=5, base=1.0, cap=30.0, max_retry_after=60.0):
+    """
+    Call fn, retrying transient failures with exponential backoff and jitter.
+
+    Only the exceptions in retry_on (rate limits, timeouts, connection errors) are
+    retried. Any other failure, such as an authentication or invalid-request error
+    or an unexpected response shape, would fail the same way again, so it ends the
+    call at once instead of paying for further attempts.
+
+    Args:
+        fn (callable): Zero-argument function performing the API call.
+        retry_on (tuple): Exception types that are worth retrying.
+        max_attempts (int): Maximum number of attempts.
+        base (float): Delay in seconds before the first retry.
+        cap (float): Upper bound on the backoff delay in seconds.
+        max_retry_after (float): Upper bound in seconds on a delay requested through Retry-After.
+
+    Returns:
+        The return value of fn, or None if the call failed.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            logging.warning(f"API call failed (attempt {attempt + 1}/{max_attempts}): {str(e)}")
+            if attempt + 1 < max_attempts:
+                time.sleep(_backoff(e, attempt, base, cap, max_retry_after))
+        except Exception as e:
+            logging.error(f"API call failed: {str(e)}")
+            return None
+    return None
@@ -1,7 +1,8 @@
 import os
 from dotenv import load_dotenv
 import anthropic
-import time
+from ._retry import call_with_retry
+from ._cache import lru_disk_cache
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 api_key = os.getenv('ANTHROPIC_API_KEY')
@@ -10,20 +11,18 @@ client = anthropic.Anthropic(
     api_key=api_key,
 )
 
+RETRY_ON = (anthropic.RateLimitError, anthropic.APITimeoutError, anthropic.APIConnectionError)
+
+def _text(message):
+    return message.content[0].text
+
+@lru_disk_cache()
 def get_response(prompt, model_name="claude-instant-1.2"):
-    for _ in range(3):
-        try:
-            message = client.messages.create(
-                model= model_name,
-                max_tokens=1000,
-                temperature=0.0,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return message.content[0].text
-        except Exception as e:
-            print(e)
-            time.sleep(20)
-            continue
-    return None
\ No newline at end of file
+    return call_with_retry(lambda: _text(client.messages.create(
+        model=model_name,
+        max_tokens=1000,
+        temperature=0.0,
+        messages=[
+            {"role": "user", "content": prompt}
+        ]
+    )), RETRY_ON)
@@ -1,24 +1,21 @@
 import os
 from dotenv import load_dotenv
-import time
 import google.generativeai as genai
+from google.api_core import exceptions
+from ._retry import call_with_retry
+from ._cache import lru_disk_cache
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 api_key = os.getenv('GOOGLE_API_KEY')
 
 genai.configure(api_key = api_key)
 
+RETRY_ON = (exceptions.ResourceExhausted, exceptions.DeadlineExceeded, exceptions.ServiceUnavailable)
+
+@lru_disk_cache()
 def get_response(prompt, model_name="gemini-1.0-pro"):
     model = genai.GenerativeModel(model_name)
-    for _ in range(3):
-        try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            print(e)
-            time.sleep(20)
-            continue
-    return None
+    return call_with_retry(lambda: model.generate_content(prompt).text, RETRY_ON)
 """
 Available models as of 2024-05-04:
 models/gemini-1.0-pro ** This is the model we will use
@@ -1,42 +1,111 @@
 import sqlite3
-import json
 import math
 import argparse
+import numpy as np
 
-def calculate_elo_scores(conn, k_factor=32, initial_score=1000):
-    scores = {}
+def load_matches(conn):
+    """
+    Load the evaluation results as integer-coded matches.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the results database.
+
+    Returns:
+        tuple: The model names in order of first appearance, and lists of winner and loser ids.
+    """
+    ids = {}
+    winners = []
+    losers = []
     cursor = conn.cursor()
-    cursor.execute("SELECT model_a, model_b, relation FROM evaluation_results")
-    results = cursor.fetchall()
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(evaluation_results)")}
+    if "winner" in columns:
+        cursor.execute("SELECT model_a, model_b, winner, loser FROM evaluation_results")
+    else:
+        # Databases written before winner/loser were split out of relation
+        cursor.execute("SELECT model_a, model_b, json_extract(relation, '$[0]'), json_extract(relation, '$[1]') FROM evaluation_results")
+
+    # Iterate the cursor directly so rows stream from SQLite instead of being materialized
+    for model_a, model_b, winner, loser in cursor:
+        ids.setdefault(model_a, len(ids))
+        ids.setdefault(model_b, len(ids))
+
+        if winner is not None:
+            winners.append(ids[winner])
+            losers.append(ids[loser])
+
+    return list(ids), winners, losers
+
+def calculate_elo_scores(conn, k_factor=32, initial_score=1000):
+    names, winners, losers = load_matches(conn)
+    scores = [float(initial_score)] * len(names)
+
+    # Sequential Elo depends on match order, so the update itself stays a loop
+    # over plain floats, which is cheaper than indexing NumPy scalars
+    for winner, loser in zip(winners, losers):
+        ea = 1 / (1 + 10 ** ((scores[loser] - scores[winner]) / 400))
+        # The loser's expected score is 1 - ea, so both ratings move by the same amount
+        delta = k_factor * (1 - ea)
+        scores[winner] += delta
+        scores[loser] -= delta
+
+    return dict(zip(names, scores))
+
+def calculate_bradley_terry_scores(conn, initial_score=1000, prior=1.0, max_iter=1000, tol=1e-9):
+    """
+    Calculate order-independent ratings by fitting a Bradley-Terry model.
+
+    The maximum likelihood strengths are found with the minorization-maximization
+    algorithm and reported on the Elo scale, centred on initial_score.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the results database.
+        initial_score (float): Rating of a model of average strength.
+        prior (float): Virtual games split evenly between every pair of models, so
+            models that never won or never lost still get a finite rating.
+        max_iter (int): Maximum number of iterations.
+        tol (float): Convergence threshold on the change in log-strengths.
 
-    for row in results:
-        model_a, model_b, relation = row
-        relation = json.loads(relation)
+    Returns:
+        dict: Rating for each model.
+    """
+    names, winners, losers = load_matches(conn)
+    n = len(names)
+    if n == 0:
+        return {}
+    winners = np.array(winners, dtype=np.intp)
+    losers = np.array(losers, dtype=np.intp)
 
-        if model_a not in scores:
-            scores[model_a] = initial_score
-        if model_b not in scores:
-            scores[model_b] = initial_score
+    games = np.zeros((n, n))
+    np.add.at(games, (winners, losers), 1.0)
+    games = games + games.T + prior * (1.0 - np.eye(n))
+    wins = np.bincount(winners, minlength=n) + prior * (n - 1) / 2
 
-        if relation is not None:
-            winner, loser = relation
-            ra = scores[winner]
-            rb = scores[loser]
-            ea = 1 / (1 + 10 ** ((rb - ra) / 400))
-            eb = 1 / (1 + 10 ** ((ra - rb) / 400))
-            scores[winner] += k_factor * (1 - ea)
-            scores[loser] += k_factor * (0 - eb)
+    log_strength = np.zeros(n)
+    for _ in range(max_iter):
+        strength = np.exp(log_strength)
+        denom = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        updated = np.log(wins) - np.log(denom)
+        updated -= updated.mean()
+        converged = np.abs(updated - log_strength).max() < tol
+        log_strength = updated
+        if converged:
+            break
 
-    return scores
+    ratings = initial_score + 400 * log_strength / math.log(10)
+    return dict(zip(names, ratings.tolist()))
 
 def main():
     parser = argparse.ArgumentParser(description="Calculate Elo scores for models")
     parser.add_argument("--db_path", type=str, help="Path to the database file")
+    parser.add_argument("--method", type=str, choices=["elo", "bradley-terry"], default="elo", help="Sequential Elo updates or an order-independent Bradley-Terry fit")
     args = parser.parse_args()
     db_path = args.db_path
     conn = sqlite3.connect(db_path)
 
-    elo_scores = calculate_elo_scores(conn)
+    if args.method == "bradley-terry":
+        elo_scores = calculate_bradley_terry_scores(conn)
+    else:
+        elo_scores = calculate_elo_scores(conn)
     print("Elo Scores:")
     for model, score in elo_scores.items():
         print(f"{model}: {score}")
@@ -44,4 +113,4 @@ def main():
     conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,12 +1,86 @@
-import json
+import orjson
 import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import re
 import logging
 from tqdm import tqdm
 import sqlite3
+import queue
 from threading import Lock
+from contextlib import contextmanager
 import argparse
+import importlib
+
+ANSWER_RE = re.compile(r'<answer>(.*?)</answer>', re.IGNORECASE | re.DOTALL)
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Only the single writer gets the large page cache; readers keep SQLite's default, since
+# each reader would otherwise grow its own cache toward the size of the database
+WRITER_PRAGMAS = (
+    "PRAGMA cache_size=-1000000",
+)
+
+def _apply_pragmas(conn, pragmas=PRAGMAS):
+    for pragma in pragmas:
+        conn.execute(pragma)
+
+class DBPool:
+    """
+    Connections to the results database: one writer and a pool of readers.
+
+    WAL mode lets the readers run alongside the writer, while the writer
+    lock serializes writes within the process so they never contend for
+    SQLite's write lock.
+    """
+
+    def __init__(self, db_path, readers=5):
+        self.writer = self._connect(db_path)
+        _apply_pragmas(self.writer, WRITER_PRAGMAS)
+        self.writer_lock = Lock()
+        self.readers = queue.Queue()
+        self.num_readers = readers
+        for _ in range(readers):
+            self.readers.put(self._connect(db_path))
+
+    @staticmethod
+    def _connect(db_path):
+        conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        _apply_pragmas(conn)
+        return conn
+
+    @contextmanager
+    def read(self):
+        """Borrow a reader connection for the duration of the block."""
+        conn = self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        """Run the block as a single write transaction on the writer connection."""
+        with self.writer_lock:
+            self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.writer
+            except BaseException:
+                self.writer.rollback()
+                raise
+            self.writer.commit()
+
+    def close(self):
+        self.writer.close()
+        for _ in range(self.num_readers):
+            self.readers.get().close()
 
 def load_config(config_path):
     """
@@ -20,190 +94,212 @@ def load_config(config_path):
 
     Raises:
         FileNotFoundError: If the configuration file is not found.
-        json.JSONDecodeError: If the configuration file is not a valid JSON.
+        orjson.JSONDecodeError: If the configuration file is not a valid JSON.
     """
     try:
-        with open(config_path) as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        with open(config_path, "rb") as f:
+            return orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError) as e:
         logging.error(f"Error loading configuration file: {str(e)}")
         raise
 
-def prompt_model(db_path, model_name, model_config, question_id, question, lock):
+def resolve_models(config):
+    """
+    Import the response function and build the call arguments of every model once.
+
+    The function and its keyword arguments are attached to each model configuration
+    as "_get_response" and "_kwargs" so the worker threads don't go through the
+    import machinery or the params lookups on every call.
+
+    Args:
+        config (dict): The loaded configuration.
+
+    Raises:
+        ImportError: If a model's module cannot be imported.
+        AttributeError: If a model's module has no such response function.
+    """
+    model_configs = list(config["participant_models"].values()) + [config["evaluator_model"]]
+    for model_config in model_configs:
+        module = importlib.import_module(model_config["module"])
+        model_config["_get_response"] = getattr(module, model_config.get("function", "get_response"))
+        model_config["_kwargs"] = {model_config["params"]["key"]: model_config["params"]["option"]}
+
+def prompt_model(pool, model_name, model_config, question_id, question):
     """
     Prompt a single model and store the response in the database.
 
     Args:
+        pool (DBPool): Connections to the results database.
         model_name (str): Name of the model.
         model_config (dict): Configuration of the model.
         question_id (int): ID of the question being processed.
         question (str): The question to prompt the model with.
-        lock (threading.Lock): Lock for thread-safe database access.
 
     Returns:
-        tuple: A tuple containing the model name and its response.
+        tuple: A tuple containing the model name and its response, or None if no response was stored.
     """
-    module_name = model_config["module"]
-    model_params = model_config["params"]
-    model_key = model_params["key"]
-    model_option = model_params["option"]
-
-    conn = sqlite3.connect(db_path)
-    with lock:
-        cursor = conn.cursor()
-        cursor.execute("SELECT response FROM model_responses WHERE model_name = ? AND question_id = ?", (model_name, question_id))
-        response_result = cursor.fetchone()
-        if response_result:
-            conn.close()  # Close the connection before returning
-            return model_name, response_result[0]
+    with pool.read() as conn:
+        response_result = conn.execute("SELECT response FROM model_responses WHERE model_name = ? AND question_id = ?", (model_name, question_id)).fetchone()
+    if response_result:
+        return model_name, response_result[0]
 
+    # Response functions are configurable, so any exception they raise is logged rather than
+    # allowed to abort the other models of the question
     try:
-        module = __import__(module_name, fromlist=["get_response"])
-        get_response = getattr(module, "get_response")
-        response = get_response(question, **{model_key: model_option})
-        
-        # Convert response to string before inserting into the database
-        response_str = str(response)
+        response = model_config["_get_response"](question, **model_config["_kwargs"])
+    except Exception as e:
+        logging.error(f"Error prompting model {model_name}: {str(e)}")
+        return model_name, None
+    if response is None:
+        # Retries exhausted; store nothing so the pair is asked again on the next run
+        logging.error(f"No response from model {model_name} for question {question_id}")
+        return model_name, None
 
-        with lock:
-            cursor.execute("INSERT INTO model_responses (model_name, question_id, response) VALUES (?, ?, ?)", (model_name, question_id, response_str))
-            conn.commit()
+    # Convert response to string before inserting into the database
+    response_str = str(response)
 
-        conn.close()  # Close the connection before returning
-        return model_name, response
+    with pool.write() as conn:
+        conn.execute("INSERT INTO model_responses (model_name, question_id, response) VALUES (?, ?, ?)", (model_name, question_id, response_str))
 
-    except (ImportError, AttributeError) as e:
-        logging.error(f"Error prompting model {model_name}: {str(e)}")
-        conn.close()  # Close the connection before returning
-        return model_name, None
+    return model_name, response
+
+def _evaluate_pair(question_id, question, model_a, model_b, available_responses, evaluator_model, eval_prompt):
+    """
+    Ask the evaluator to compare the responses of two models to a question.
+
+    Returns:
+        tuple: The evaluation result and its evaluation_results row, or None if the evaluation failed.
+    """
+    try:
+        prompt = eval_prompt.format(question=question, response_A=available_responses[model_a], response_B=available_responses[model_b])
+    except (KeyError, IndexError, ValueError) as e:
+        # Unknown or malformed placeholders in the configured eval_prompt
+        logging.error(f"Invalid eval_prompt for question {question_id}: {str(e)}")
+        return None
 
-def evaluate_responses(db_path, question_id, question, model_names, evaluator_model, eval_prompt, lock):
+    # Get the evaluation result from the evaluator model
+    try:
+        evaluation_result = evaluator_model["_get_response"](prompt, **evaluator_model["_kwargs"])
+    except Exception as e:
+        logging.error(f"Error evaluating {model_a} and {model_b} responses for question {question_id}: {str(e)}")
+        return None
+    if evaluation_result is None:
+        logging.error(f"No evaluator response for {model_a} and {model_b} on question {question_id}")
+        return None
+
+    # Only the last answer counts; keep it without materializing every match
+    answer = None
+    for match in ANSWER_RE.finditer(evaluation_result):
+        answer = match.group(1)
+    if answer is not None:
+        answer = answer.strip().upper()
+
+    relation = None
+    if answer == 'A':
+        relation = [model_a, model_b]
+    elif answer == 'B':
+        relation = [model_b, model_a]
+
+    result = {
+        "model_A": model_a,
+        "model_B": model_b,
+        "evaluator_response": evaluation_result,
+        "relation": relation
+    }
+
+    winner, loser = relation if relation else (None, None)
+    return result, (model_a, model_b, question_id, evaluation_result, orjson.dumps(relation).decode(), winner, loser)
+
+def evaluate_responses(pool, executor, question_id, question, model_names, evaluator_model, eval_prompt):
     results = []
+    eval_rows = []
+
+    # Retrieve available responses and already processed pairs from the database
+    with pool.read() as conn:
+        available_responses = {model_name: response for model_name, response in conn.execute("SELECT model_name, response FROM model_responses WHERE question_id = ?", (question_id,)) if model_name in model_names}
+        # A stored result marks the pair as evaluated in either presentation order
+        done = {frozenset(pair) for pair in conn.execute("SELECT model_a, model_b FROM evaluation_results WHERE question_id = ?", (question_id,))}
+
+    pairs = []
+    for model_a, model_b in itertools.combinations(model_names, 2):
+        # Check if responses are available for both models
+        if model_a not in available_responses or model_b not in available_responses:
+            continue
+
+        # Check if the evaluation is already processed, whichever order it was shown in
+        if frozenset((model_a, model_b)) in done:
+            continue
+
+        # Randomize only the presentation order to debias the evaluator
+        if random.random() < 0.5:
+            model_a, model_b = model_b, model_a
+        pairs.append((model_a, model_b))
+
+    # Evaluator calls are independent per pair, so run them in parallel on the shared executor
+    futures = [executor.submit(_evaluate_pair, question_id, question, model_a, model_b, available_responses, evaluator_model, eval_prompt) for model_a, model_b in pairs]
+    for future in futures:
+        evaluation = future.result()
+        if evaluation is not None:
+            result, eval_row = evaluation
+            results.append(result)
+            eval_rows.append(eval_row)
 
-    conn = sqlite3.connect(db_path)
-
-    # Retrieve available responses from the database
-    available_responses = {}
-    with lock:
-        cursor = conn.cursor()
-        for model_name in model_names:
-            cursor.execute("SELECT response FROM model_responses WHERE model_name = ? AND question_id = ?", (model_name, question_id))
-            response_result = cursor.fetchone()
-            if response_result:
-                available_responses[model_name] = response_result[0]
-
-    for i in range(len(model_names)):
-        for j in range(i + 1, len(model_names)):
-            if random.random() < 0.5:
-                model_a, model_b = model_names[i], model_names[j]
-            else:
-                model_b, model_a = model_names[i], model_names[j]
-
-            # Check if responses are available for both models
-            if model_a not in available_responses or model_b not in available_responses:
-                continue
-
-            # Check if the evaluation is already processed
-            with lock:
-                cursor.execute("SELECT processed FROM evaluation_progress WHERE question_id = ? AND model_a = ? AND model_b = ?", (question_id, model_a, model_b))
-                evaluation_result = cursor.fetchone()
-                if evaluation_result and evaluation_result[0]:
-                    continue
+    # Store the evaluation results in one write transaction
+    if eval_rows:
+        with pool.write() as conn:
+            conn.executemany("INSERT OR IGNORE INTO evaluation_results (model_a, model_b, question_id, evaluator_response, relation, winner, loser) VALUES (?, ?, ?, ?, ?, ?, ?)", eval_rows)
 
-            try:
-                module_evaluator = __import__(evaluator_model["module"], fromlist=["get_response"])
-                get_response_evaluator = getattr(module_evaluator, "get_response")
-
-                prompt = eval_prompt.format(question=question, response_A=available_responses[model_a], response_B=available_responses[model_b])
-
-                evaluator_key = evaluator_model["params"]["key"]
-                evaluator_option = evaluator_model["params"]["option"]
-
-                # Get the evaluation result from the evaluator model
-                evaluation_result = get_response_evaluator(prompt, **{evaluator_key: evaluator_option})
-
-                matches = re.findall(r'<answer>(.*?)</answer>', evaluation_result, re.IGNORECASE)
-                answer = matches[-1].strip().upper() if matches else None
-
-                relation = None
-                if answer == 'A':
-                    relation = [model_a, model_b]
-                elif answer == 'B':
-                    relation = [model_b, model_a]
-
-                result = {
-                    "model_A": model_a,
-                    "model_B": model_b,
-                    "evaluator_response": evaluation_result,
-                    "relation": relation
-                }
-                results.append(result)
-
-                # Store the evaluation result in the database
-                with lock:
-                    cursor.execute("INSERT INTO evaluation_results (model_a, model_b, question_id, evaluator_response, relation) VALUES (?, ?, ?, ?, ?)", (model_a, model_b, question_id, evaluation_result, json.dumps(relation)))
-                    cursor.execute("INSERT OR REPLACE INTO evaluation_progress (question_id, model_a, model_b, processed) VALUES (?, ?, ?, 1)", (question_id, model_a, model_b))
-                    cursor.execute("INSERT OR REPLACE INTO evaluation_progress (question_id, model_a, model_b, processed) VALUES (?, ?, ?, 1)", (question_id, model_b, model_a))
-                    conn.commit()
-            except (ImportError, AttributeError, IndexError) as e:
-                logging.error(f"Error evaluating {model_a} and {model_b} responses for question {question_id}: {str(e)}")
-
-    conn.close()
     return results
 
-def process_question(db_path, question_id, question, participant_models, evaluator_model, eval_prompt, lock, max_workers_models):
+def process_question(pool, executor, question_id, question, participant_models, evaluator_model, eval_prompt):
     """
     Process a single question by prompting models, evaluating responses, and storing the results in the database.
 
     Args:
+        pool (DBPool): Connections to the results database.
+        executor (ThreadPoolExecutor): Executor shared by all questions for model calls.
         question_id (int): ID of the question being processed.
         question (str): The question to prompt the models with.
         participant_models (dict): Dictionary of participant models and their configurations.
         evaluator_model (dict): Configuration of the evaluator model.
         eval_prompt (str): Prompt template for evaluation.
-        lock (threading.Lock): Lock for thread-safe database access.
-        max_workers_models (int): Maximum number of worker threads for model prompting.
 
     Returns:
         dict: Dictionary containing the question ID, question, model responses, and evaluation results.
     """
     model_responses = {}
-
-    # Prompt models in parallel using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=max_workers_models) as executor:
-        futures = []
-        for model_name, model_config in participant_models.items():
-            # Check if the response for the question-model pair has already been processed
-            conn = sqlite3.connect(db_path)
-            with lock:
-                cursor = conn.cursor()
-                cursor.execute("SELECT processed FROM response_progress WHERE question_id = ? AND model_name = ?", (question_id, model_name))
-                result = cursor.fetchone()
-                if result and result[0]:
-                    conn.close()
-                    continue
-            conn.close()
-
-            # Submit the model prompting task to the executor
-            future = executor.submit(prompt_model, db_path, model_name, model_config, question_id, question, lock)
-            futures.append(future)
-
-        # Collect model responses as they complete
-        for future in as_completed(futures):
-            model_name, response = future.result()
-            model_responses[model_name] = response
-
-            # Update the response progress in the database
-            conn = sqlite3.connect(db_path)
-            with lock:
-                cursor = conn.cursor()
-                cursor.execute("INSERT OR REPLACE INTO response_progress (question_id, model_name, processed) VALUES (?, ?, 1)", (question_id, model_name))
-                conn.commit()
-            conn.close()
+    progress_rows = []
+
+    with pool.read() as conn:
+        done_models = {model_name for model_name, processed in conn.execute("SELECT model_name, processed FROM response_progress WHERE question_id = ?", (question_id,)) if processed}
+
+    # Prompt models in parallel on the shared executor
+    futures = []
+    for model_name, model_config in participant_models.items():
+        # Check if the response for the question-model pair has already been processed
+        if model_name in done_models:
+            continue
+
+        # Submit the model prompting task to the executor
+        future = executor.submit(prompt_model, pool, model_name, model_config, question_id, question)
+        futures.append(future)
+
+    # Collect model responses as they complete
+    for future in as_completed(futures):
+        model_name, response = future.result()
+        model_responses[model_name] = response
+        # Only mark the pair processed once a response has actually been stored
+        if response is not None:
+            progress_rows.append((question_id, model_name))
+
+    # Update the response progress in the database
+    if progress_rows:
+        with pool.write() as conn:
+            conn.executemany("INSERT OR REPLACE INTO response_progress (question_id, model_name, processed) VALUES (?, ?, 1)", progress_rows)
 
     # Evaluate responses
     model_names = list(participant_models.keys())
-    evaluation_results = evaluate_responses(db_path, question_id, question, model_names, evaluator_model, eval_prompt, lock)
+    evaluation_results = evaluate_responses(pool, executor, question_id, question, model_names, evaluator_model, eval_prompt)
 
     return {
         "question_id": question_id,
@@ -220,6 +316,7 @@ def main():
     parser.add_argument('--config', type=str, help='Path to the configuration file')
     args = parser.parse_args()
     config = load_config(args.config)
+    resolve_models(config)
     
     evaluator_model = config["evaluator_model"]
     participant_models = config["participant_models"]
@@ -229,62 +326,82 @@ def main():
 
     eval_prompt = config['eval_prompt']
 
-    lock = Lock()
-
     db_path = config['results_db']
-    conn = sqlite3.connect(db_path)
-    # Create necessary tables if they don't exist
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS model_responses (
-            model_name TEXT,
-            question_id INTEGER,
-            response TEXT,
-            PRIMARY KEY (model_name, question_id)
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS evaluation_results (
-            model_a TEXT,
-            model_b TEXT,
-            question_id INTEGER,
-            evaluator_response TEXT,
-            relation TEXT,
-            PRIMARY KEY (model_a, model_b, question_id)
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS response_progress (
-            question_id INTEGER,
-            model_name TEXT,
-            processed INTEGER,
-            PRIMARY KEY (question_id, model_name)
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS evaluation_progress (
-            question_id INTEGER,
-            model_a TEXT,
-            model_b TEXT,
-            processed INTEGER,
-            PRIMARY KEY (question_id, model_a, model_b)
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-    # Process questions in parallel using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=max_workers_questions) as executor:
-        futures = []
-        for question_id, question in enumerate(questions, start=1):
-            future = executor.submit(process_question, db_path, question_id, question, participant_models, evaluator_model, eval_prompt, lock, max_workers_models)
-            futures.append(future)
-
-        # Collect results as questions complete and display progress using tqdm
-        results = []
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing questions"):
-            result = future.result()
-            results.append(result)
+    pool = DBPool(db_path, readers=max_workers_questions * max_workers_models)
+    try:
+        # Create necessary tables if they don't exist
+        with pool.write() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS model_responses (
+                    model_name TEXT,
+                    question_id INTEGER,
+                    response TEXT,
+                    PRIMARY KEY (model_name, question_id)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS evaluation_results (
+                    model_a TEXT,
+                    model_b TEXT,
+                    question_id INTEGER,
+                    evaluator_response TEXT,
+                    relation TEXT,
+                    winner TEXT,
+                    loser TEXT,
+                    PRIMARY KEY (model_a, model_b, question_id)
+                )
+            """)
+            # Databases created before winner/loser were split out of relation
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(evaluation_results)")}
+            if "winner" not in columns:
+                conn.execute("ALTER TABLE evaluation_results ADD COLUMN winner TEXT")
+                conn.execute("ALTER TABLE evaluation_results ADD COLUMN loser TEXT")
+                conn.execute("UPDATE evaluation_results SET winner = json_extract(relation, '$[0]'), loser = json_extract(relation, '$[1]')")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_progress (
+                    question_id INTEGER,
+                    model_name TEXT,
+                    processed INTEGER,
+                    PRIMARY KEY (question_id, model_name)
+                )
+            """)
+            # Evaluation progress is derived from evaluation_results; the old bookkeeping table is redundant
+            conn.execute("DROP TABLE IF EXISTS evaluation_progress")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mr_qm ON model_responses(question_id, model_name)")
+            # Covering index for the per-question scan of evaluated pairs
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_er_qab ON evaluation_results(question_id, model_a, model_b)")
+
+        # Process questions in parallel using ThreadPoolExecutor. Model calls go to a
+        # separate executor shared by all questions: submitting them to the question
+        # executor could deadlock once every worker is a question waiting on its models.
+        with ThreadPoolExecutor(max_workers=max_workers_questions * max_workers_models) as model_executor, \
+                ThreadPoolExecutor(max_workers=max_workers_questions) as executor:
+            # Keep at most twice as many questions in flight as there are workers
+            pending_questions = enumerate(questions, start=1)
+
+            def submit_next():
+                question_id, question = next(pending_questions)
+                return executor.submit(process_question, pool, model_executor, question_id, question, participant_models, evaluator_model, eval_prompt)
+
+            pending = set()
+            for _ in range(min(len(questions), 2 * max_workers_questions)):
+                pending.add(submit_next())
+
+            # Wait for questions to complete and display progress using tqdm. Everything is
+            # already stored in the database, so results are not kept in memory; result()
+            # only re-raises a question's error.
+            with tqdm(total=len(questions), desc="Processing questions") as progress:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                        progress.update(1)
+                        try:
+                            pending.add(submit_next())
+                        except StopIteration:
+                            pass
+    finally:
+        pool.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file